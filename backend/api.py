@@ -1,26 +1,138 @@
+import os
+
+# Per-request matrices are tiny, so BLAS thread start-up costs more than it saves.
+# This must be set before numpy is imported by the search engine or classifier.
+os.environ.setdefault("OPENBLAS_NUM_THREADS", "1")
+
+import asyncio
+import hashlib
+import numpy as np
+import orjson
+from collections import OrderedDict
 from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
 from contextlib import asynccontextmanager
+from anyio.to_thread import current_default_thread_limiter
 from search_engine import SearchEngine
-from classification import load_classifier_and_labels
+from classification import load_classifier_and_labels, FusedClassifier
 
 # This dictionary will hold machine learning models
 # to avoid reloading them on every request.
 ml_models = {}
 
+# Maximum number of sync endpoint calls Starlette runs concurrently in its threadpool
+THREADPOOL_SIZE = 64
+
+# Concurrent /classify requests are coalesced into a single classifier call.
+# A batch takes every request already queued, up to MAX_BATCH_SIZE documents.
+# Only when requests are piling up does it wait up to MAX_BATCH_WAIT seconds
+# for more, so a lone request is classified without any delay.
+MAX_BATCH_SIZE = 32
+MAX_BATCH_WAIT = 0.005
+
+# Upper bound on the number of documents accepted by one /classify_batch request
+MAX_DOCUMENTS_PER_BATCH = 1000
+
+# Recent predictions are kept in an LRU cache so resubmitted documents skip the
+# classifier entirely. Entries store the label index rather than the label name
+# and the cache is cleared whenever the models are (re)loaded.
+PREDICTION_CACHE_SIZE = 4096
+prediction_cache: OrderedDict[bytes, tuple[int, float]] = OrderedDict()
+
+def prediction_cache_key(text: str) -> bytes:
+    """
+    Returns a compact hash of the text, normalized the same way the TF-IDF
+    vectorizer sees it (case and whitespace do not change the features).
+    """
+    normalized = ' '.join(text.lower().split())
+    return hashlib.blake2b(normalized.encode('utf-8'), digest_size=16).digest()
+
+def predict_batch(texts: list[str]) -> list[tuple[int, float]]:
+    """
+    Classifies a batch of texts in a single pass and returns
+    a (label index, confidence) pair for each text.
+    """
+    indices, confidences = ml_models["classifier"].predict_with_confidence(texts)
+    return [
+        (int(index), float(confidence))
+        for index, confidence in zip(indices, confidences)
+    ]
+
+async def classification_worker(queue: asyncio.Queue):
+    """
+    Background task that pulls pending (text, future) pairs off the queue,
+    classifies them in batches and resolves each request's future.
+    """
+    loop = asyncio.get_running_loop()
+    backlogged = False
+    while True:
+        batch = [await queue.get()]
+        deadline = loop.time() + MAX_BATCH_WAIT
+
+        # Take whatever is already queued. Requests arriving while this batch is
+        # classified are picked up by the next one.
+        while len(batch) < MAX_BATCH_SIZE:
+            try:
+                batch.append(queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+
+        # Under load (several requests were waiting, or the last batch was full)
+        # wait briefly for more so the batch fills up
+        if backlogged or len(batch) > 1:
+            while len(batch) < MAX_BATCH_SIZE:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), remaining))
+                except TimeoutError:
+                    break
+        backlogged = len(batch) >= MAX_BATCH_SIZE
+
+        texts = [text for text, _ in batch]
+        try:
+            # Run the CPU-bound prediction off the event loop
+            results = await asyncio.to_thread(predict_batch, texts)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            continue
+
+        for (_, future), result in zip(batch, results):
+            # The request may have been cancelled while waiting
+            if not future.done():
+                future.set_result(result)
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # This code runs on startup
     print("--- Loading ML models ---")
     
+    # Allow more blocking requests (e.g. /search) to run in parallel threads
+    current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+    
     # Load the Search Engine Index
     ml_models["search_engine"] = SearchEngine()
     
     # Load the Document Classifier
     classifier, labels = load_classifier_and_labels()
-    ml_models["classifier"] = classifier
-    ml_models["classifier_labels"] = labels
+    prediction_cache.clear()
+    # Serve predictions from the fused inference tables rather than the Pipeline
+    ml_models["classifier"] = FusedClassifier(classifier)
+    # A numpy object array lets batch endpoints look up all labels with one gather
+    ml_models["classifier_labels"] = np.asarray(labels, dtype=object)
+    
+    # Run one dummy prediction so lazy imports and first-call allocations
+    # happen now rather than on the first real request
+    predict_batch(["warmup text"])
+    
+    # Start the background worker that batches classification requests
+    ml_models["classifier_queue"] = asyncio.Queue()
+    worker = asyncio.create_task(classification_worker(ml_models["classifier_queue"]))
     
     print("--- Models loaded successfully ---")
     
@@ -28,10 +140,13 @@ async def lifespan(app: FastAPI):
     
     # This code runs on shutdown
     print("--- Clearing ML models ---")
+    worker.cancel()
     ml_models.clear()
+    prediction_cache.clear()
 
-# Initialize the FastAPI app with the lifespan manager
-app = FastAPI(lifespan=lifespan)
+# Initialize the FastAPI app with the lifespan manager.
+# Responses are serialized with orjson, which is much faster than the stdlib json module.
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # List of allowed origins
 origins = [
@@ -53,6 +168,9 @@ app.add_middleware(
 class Document(BaseModel):
     text: str
 
+class DocumentBatch(BaseModel):
+    texts: list[str] = Field(..., max_length=MAX_DOCUMENTS_PER_BATCH)
+
 class ClassificationResponse(BaseModel):
     category: str
     confidence: float
@@ -64,10 +182,13 @@ def read_root():
     return {"message": "Welcome to the Search and Classification API"}
 
 @app.get("/search")
-async def search(q: str = Query(..., min_length=3, description="The search query string.")):
+def search(q: str = Query(..., min_length=3, description="The search query string.")):
     """
     Performs a search using the loaded search engine index.
     Handles both bag-of-words and "quoted phrase" searches.
+    
+    Declared as a plain function because searching is CPU-bound, so FastAPI
+    runs it in the threadpool instead of blocking the event loop.
     """
     if "search_engine" not in ml_models:
         raise HTTPException(status_code=503, detail="Search engine is not available.")
@@ -79,29 +200,67 @@ async def search(q: str = Query(..., min_length=3, description="The search query
         raise HTTPException(status_code=500, detail=f"An error occurred during search: {e}")
 
 
-@app.post("/classify", response_model=ClassificationResponse)
+# The response is built directly rather than validated against
+# ClassificationResponse, which is only used to document the endpoint.
+@app.post("/classify", responses={200: {"model": ClassificationResponse}})
 async def classify(document: Document):
     """
     Classifies a given text into one of the pre-trained categories
     (Business, Health, Politics).
     """
-    if "classifier" not in ml_models or "classifier_labels" not in ml_models:
+    if "classifier_queue" not in ml_models or "classifier_labels" not in ml_models:
         raise HTTPException(status_code=503, detail="Classifier is not available.")
         
     try:
         text_to_classify = document.text
         
-        # Predict the category index and probabilities
-        classifier = ml_models["classifier"]
-        labels = ml_models["classifier_labels"]
+        cache_key = prediction_cache_key(text_to_classify)
+        cached = prediction_cache.get(cache_key)
         
-        prediction_index = classifier.predict([text_to_classify])[0]
-        probabilities = classifier.predict_proba([text_to_classify])[0]
+        if cached is not None:
+            prediction_cache.move_to_end(cache_key)
+            prediction_index, confidence = cached
+        else:
+            # Hand the text to the batching worker and wait for its prediction
+            future = asyncio.get_running_loop().create_future()
+            await ml_models["classifier_queue"].put((text_to_classify, future))
+            prediction_index, confidence = await future
+            
+            prediction_cache[cache_key] = (prediction_index, confidence)
+            if len(prediction_cache) > PREDICTION_CACHE_SIZE:
+                prediction_cache.popitem(last=False)
         
         # Get the results
+        labels = ml_models["classifier_labels"]
         category = labels[prediction_index]
-        confidence = probabilities[prediction_index]
         
-        return {"category": category, "confidence": confidence}
+        return ORJSONResponse({"category": category, "confidence": confidence})
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"An error occurred during classification: {e}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"An error occurred during classification: {e}")
+
+
+@app.post("/classify_batch")
+async def classify_batch(batch: DocumentBatch):
+    """
+    Classifies many documents in one request and streams the results back as
+    newline-delimited JSON, one {"i", "category", "confidence"} object per text.
+    """
+    if "classifier" not in ml_models or "classifier_labels" not in ml_models:
+        raise HTTPException(status_code=503, detail="Classifier is not available.")
+        
+    try:
+        # Classify the whole batch in a single call off the event loop
+        indices, confidences = await asyncio.to_thread(
+            ml_models["classifier"].predict_with_confidence, batch.texts
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An error occurred during classification: {e}")
+    
+    categories = ml_models["classifier_labels"][indices].tolist()
+    confidences = confidences.tolist()
+    
+    def generate_lines():
+        for i, (category, confidence) in enumerate(zip(categories, confidences)):
+            yield orjson.dumps({"i": i, "category": category, "confidence": confidence}) + b"\n"
+    
+    return StreamingResponse(generate_lines(), media_type="application/x-ndjson")
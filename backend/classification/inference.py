@@ -0,0 +1,86 @@
+import numpy as np
+from numba import njit
+
+from classifier import labels_and_confidences
+
+@njit(cache=True, fastmath=True)
+def accumulate_scores(ids: np.ndarray, weights: np.ndarray, fused: np.ndarray, out: np.ndarray):
+    """
+    Adds weights[i] * fused[ids[i]] to out for every feature of a document.
+    out is float64 so summing many float32 rows does not lose precision.
+    Compiled to native code, this gather-and-accumulate is the inner loop of
+    FusedClassifier.
+    """
+    for i in range(ids.size):
+        row = ids[i]
+        weight = weights[i]
+        for c in range(out.size):
+            out[c] += weight * fused[row, c]
+
+class FusedClassifier:
+    """
+    Inference-only equivalent of the trained 'tfidf' -> 'clf' pipeline.
+
+    MultinomialNB scores a document as X @ feature_log_prob_.T + class_log_prior_,
+    where each entry of X is a term count multiplied by the term's IDF and then
+    divided by the document's norm. The IDF can therefore be folded into the
+    log-probabilities ahead of time, giving a (vocab_size, n_classes) table.
+    Scoring a document becomes a dictionary lookup per token, a gather of
+    the matching table rows and one division by the norm, without building
+    a SciPy sparse matrix.
+
+    The table is stored as float32 by default. Halving its size halves the
+    memory traffic of the gather, and float32 keeps the predicted label
+    identical to the float64 pipeline on the training data; confidences only
+    move in digits well below the two decimals they are displayed with.
+    """
+    def __init__(self, pipeline, dtype=np.float32):
+        tfidf = pipeline.named_steps['tfidf']
+        clf = pipeline.named_steps['clf']
+
+        # The analyzer applies the same preprocessing, stopword removal and
+        # n-gram generation as TfidfVectorizer.transform()
+        self.analyzer = tfidf.build_analyzer()
+        self.vocabulary = tfidf.vocabulary_
+        self.idf = tfidf.idf_
+        self.norm = tfidf.norm
+        self.sublinear_tf = tfidf.sublinear_tf
+
+        self.fused = np.ascontiguousarray((clf.feature_log_prob_ * self.idf[np.newaxis, :]).T, dtype=dtype)
+        self.class_log_prior = clf.class_log_prior_
+
+        # Compile the scoring kernel now (or load it from numba's on-disk cache)
+        # so the first request does not pay for JIT compilation
+        accumulate_scores(np.empty(0, dtype=np.int32), np.empty(0), self.fused, np.zeros(self.fused.shape[1]))
+
+    def joint_log_likelihood(self, texts: list) -> np.ndarray:
+        """
+        Computes the per-class joint log-likelihood for each text.
+        """
+        vocabulary = self.vocabulary
+        jll = np.tile(self.class_log_prior, (len(texts), 1))
+
+        for row, text in enumerate(texts):
+            ids = [vocabulary[term] for term in self.analyzer(text) if term in vocabulary]
+            if not ids:
+                # An empty feature vector leaves only the class priors
+                continue
+
+            ids, counts = np.unique(np.array(ids, dtype=np.int32), return_counts=True)
+            tf = 1.0 + np.log(counts) if self.sublinear_tf else counts.astype(np.float64)
+
+            scores = np.zeros(self.fused.shape[1])
+            accumulate_scores(ids, tf, self.fused, scores)
+            if self.norm == 'l2':
+                scores /= np.sqrt(np.sum((tf * self.idf[ids]) ** 2))
+            elif self.norm == 'l1':
+                scores /= np.sum(tf * self.idf[ids])
+            jll[row] += scores
+
+        return jll
+
+    def predict_with_confidence(self, texts: list) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Predicts the label index and its confidence for each text.
+        """
+        return labels_and_confidences(self.joint_log_likelihood(texts))
@@ -12,6 +12,14 @@ MAX_RETRIES = 3
 # Wait for the page to be idle for not more than 90 seconds
 PAGE_TIMEOUT = 90000
 
+# Number of pages scraped concurrently
+MAX_CONCURRENT_PAGES = 8
+
+# Render publication detail pages in the browser before parsing them. If the portal
+# serves the authors and abstract in its initial HTML, set this to False to fetch
+# the pages over plain HTTP and skip rendering entirely.
+RENDER_DETAIL_PAGES = True
+
 # Paths for storing data
-CRAWLED_DATA_FILE = os.path.join(os.path.dirname(__file__), 'data', 'crawled_publications.json')
+CRAWLED_DATA_FILE = os.path.join(os.path.dirname(__file__), 'data', 'crawled_publications.jsonl')
 INDEX_FILE = os.path.join(os.path.dirname(__file__), 'data', 'index.joblib')
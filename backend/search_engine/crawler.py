@@ -1,20 +1,59 @@
 import asyncio
-import json
 import os
 import random
-from collections import deque
-from urllib.parse import urljoin
+import re
+from urllib.parse import urljoin, urlsplit
 from urllib import robotparser
 
-from bs4 import BeautifulSoup, Tag
+import orjson
+from bs4 import BeautifulSoup, SoupStrainer, Tag
 from playwright.async_api import async_playwright, Error
 from tqdm import tqdm
 
-from config import SEED_URL, BASE_URL, MAX_RETRIES, PAGE_TIMEOUT, CRAWLED_DATA_FILE
+from config import SEED_URL, BASE_URL, MAX_RETRIES, PAGE_TIMEOUT, MAX_CONCURRENT_PAGES, RENDER_DETAIL_PAGES, CRAWLED_DATA_FILE
 
 # Define a single User-Agent constant to be used by both Playwright and the robotparser
 USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36"
 
+# Pages are parsed with the C-based lxml tree builder, which is faster than the pure-Python 'html.parser'
+HTML_PARSER = 'lxml'
+
+def class_pattern(*class_names):
+    """
+    Matches a raw class attribute that contains any of the given class names.
+    SoupStrainer sees the attribute before it is split into a list of classes,
+    so 'relations persons' must be matched as a whole string.
+    """
+    return re.compile(r'(?:^|\s)(?:' + '|'.join(map(re.escape, class_names)) + r')(?:\s|$)')
+
+# Only the elements the crawler reads are built into the tree; the rest of the page is skipped while parsing
+LISTING_PAGE_ELEMENTS = SoupStrainer(['li', 'a'], class_=class_pattern('list-result-item', 'nextLink'))
+DETAIL_PAGE_ELEMENTS = SoupStrainer(['p', 'div'], class_=class_pattern('persons', 'rendering_researchoutput_abstractportal'))
+PAGINATION_LINKS = SoupStrainer('a', href=re.compile(r'[?&]page=\d+'))
+
+# Only the HTML is parsed, so these resources are never downloaded
+BLOCKED_RESOURCE_TYPES = {'image', 'media', 'font', 'stylesheet'}
+
+# Headless Chromium needs no GPU or extensions, and a small /dev/shm in containers
+# makes it crash on larger pages unless shared memory goes through /tmp instead
+BROWSER_ARGS = ['--disable-gpu', '--disable-dev-shm-usage', '--disable-extensions']
+
+async def block_static_assets(route):
+    if route.request.resource_type in BLOCKED_RESOURCE_TYPES:
+        await route.abort()
+    else:
+        await route.continue_()
+
+# --- Resolve a link found on the portal against its base URL ---
+def absolute_url(base_url, href):
+    # Links on the portal are either absolute or root-relative, and base_url is
+    # the site origin, so both cases are resolved without parsing the URL
+    if href.startswith(('http://', 'https://')):
+        return href
+    if href.startswith('/') and not href.startswith('//'):
+        return base_url + href
+    return urljoin(base_url, href)
+
 # --- Extract author name and profile url from publication url ---
 def extract_authors_from_detail_page(soup, base_url):
     authors_data = []
@@ -24,7 +63,7 @@ def extract_authors_from_detail_page(soup, base_url):
     for element in persons_p.contents:
         if isinstance(element, Tag) and element.name == 'a':
             name = element.get_text(strip=True)
-            url = urljoin(base_url, str(element.get('href', '')))
+            url = absolute_url(base_url, str(element.get('href', '')))
             if name:
                 authors_data.append({'name': name, 'url': url})
         elif isinstance(element, str):
@@ -46,40 +85,128 @@ def extract_abstract_from_detail_page(soup):
             return text_block.get_text(strip=True)
     return '' # Return empty string if abstract is not found
 
+# --- Extract publication title, url and date from a listing page ---
+def extract_publications_from_listing_page(soup, base_url):
+    publications = []
+    for pub_item in soup.find_all('li', class_='list-result-item'):
+        if isinstance(pub_item, Tag):
+            title_tag = pub_item.find('h3', class_='title')
+            if isinstance(title_tag, Tag) and title_tag.a:
+                title = title_tag.get_text(strip=True)
+                pub_url = absolute_url(base_url, str(title_tag.a['href']))
+                date_tag = pub_item.find('span', class_='date')
+                date = date_tag.get_text(strip=True) if date_tag else "N/A"
+                publications.append({'title': title, 'url': pub_url, 'date': date})
+    return publications
+
+# --- Extract the next listing page url, if any ---
+def extract_next_page_url(soup, base_url):
+    next_page_tag = soup.find('a', class_='nextLink')
+    if isinstance(next_page_tag, Tag) and 'href' in next_page_tag.attrs:
+        return absolute_url(base_url, str(next_page_tag['href']))
+    return None
+
+# --- Build the urls of listing pages 1..N from the pagination links of the first page ---
+def extract_listing_page_urls(html, base_url, seed_url):
+    soup = BeautifulSoup(html, HTML_PARSER, parse_only=PAGINATION_LINKS)
+    # Only links back to the seed listing count as pagination; other links with a
+    # page parameter (facets, sidebars, other listings) point at unrelated pages
+    seed_location = urlsplit(seed_url)[1:3]
+    page_links = {}
+    for link in soup.find_all('a'):
+        url = absolute_url(base_url, str(link['href']))
+        if urlsplit(url)[1:3] != seed_location:
+            continue
+        page_number = int(re.search(r'[?&]page=(\d+)', url).group(1))
+        page_links[page_number] = url
+    if not page_links:
+        return []
+    # The highest linked page number is taken as the last page; the link's
+    # url serves as the template for every page in between
+    last_page = max(page_links)
+    template = page_links[last_page]
+    page_urls = (re.sub(r'([?&]page=)\d+', rf'\g<1>{n}', template) for n in range(1, last_page + 1))
+    return [url for url in page_urls if url != seed_url]
+
+# --- Keep the records an interrupted crawl already wrote, keyed by publication url ---
+def resume_partial_crawl(path, publications):
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'rb') as f:
+        data = f.read()
+    # Records are appended one line at a time, so a crash can only leave the last
+    # line incomplete; it is ignored
+    complete_lines = data[:data.rfind(b'\n') + 1].splitlines()
+
+    # A record is only kept if its publication is still listed and its detail page
+    # was scraped. Failed pages are saved without authors and abstract, so they
+    # are scraped again.
+    discovered_urls = {pub_data['url'] for pub_data in publications}
+    resumed = {}
+    for line in complete_lines:
+        if not line.strip():
+            continue
+        record = orjson.loads(line)
+        if record['url'] in discovered_urls and (record['authors'] or record['abstract']):
+            resumed[record['url']] = record
+
+    # Rewrite the file with just those records, so dropped ones never reach the
+    # final data. The replace is atomic, so a crash here loses nothing.
+    with open(path + '.tmp', 'wb') as f:
+        f.write(b''.join(orjson.dumps(record) + b'\n' for record in resumed.values()))
+    os.replace(path + '.tmp', path)
+    return resumed
+
 # --- Main Crawler Function ---
 async def crawl():
     """
     Crawls the Coventry University publications portal, respecting robots.txt.
-    It follows a BFS approach for pagination and extracts publication details.
+    It discovers the listing pages from the pagination of the first page, following
+    'next' links for any it missed, and extracts publication details.
     """
     print("Starting crawler with Playwright...")
 
     async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
+        browser = await p.chromium.launch(headless=True, args=BROWSER_ARGS)
         context = await browser.new_context(user_agent=USER_AGENT)
+        # Abort image, font, media and stylesheet requests for every page in this context
+        await context.route('**/*', block_static_assets)
 
         # robots.txt parsing
         rp = robotparser.RobotFileParser()
         robots_url = urljoin(BASE_URL, 'robots.txt')
         print(f"Fetching robots.txt from: {robots_url}")
         
-        page_robots = await context.new_page()
+        # robots.txt is plain text, so it is fetched through the context's HTTP client
+        # (same User-Agent and cookies) instead of being rendered in a browser page.
+        # Status handling follows RFC 9309: an unavailable robots.txt (4xx) allows
+        # everything, while a server error or a failed fetch means it cannot be
+        # known what is allowed, so everything is treated as disallowed
         try:
-            await page_robots.goto(robots_url, timeout=PAGE_TIMEOUT)
-            robots_content = await page_robots.content()
-            soup_robots = BeautifulSoup(robots_content, 'html.parser')
-            robots_text = soup_robots.get_text()
-
-            print("\n--- Actual robots.txt content being parsed ---")
-            print(robots_text)
-            print("----------------------------------------------\n")
-            
-            rp.parse(robots_text.splitlines())
-            print("robots.txt parsed successfully.")
+            response = await context.request.get(robots_url, timeout=PAGE_TIMEOUT)
+            if response.status in (401, 403):
+                # Same rule as RobotFileParser.read(): access-restricted robots.txt disallows everything
+                rp.disallow_all = True
+                print(f"robots.txt returned {response.status}. Treating all URLs as disallowed.")
+            elif response.ok:
+                robots_text = await response.text()
+
+                print("\n--- Actual robots.txt content being parsed ---")
+                print(robots_text)
+                print("----------------------------------------------\n")
+                
+                rp.parse(robots_text.splitlines())
+                print("robots.txt parsed successfully.")
+            elif 400 <= response.status < 500:
+                # Same rule as RobotFileParser.read(): no robots.txt allows everything
+                rp.allow_all = True
+                print(f"robots.txt returned {response.status}. Treating all URLs as allowed.")
+            else:
+                rp.disallow_all = True
+                print(f"robots.txt returned {response.status}. Treating all URLs as disallowed.")
         except Error as e:
-            print(f"Warning: Could not fetch or parse robots.txt with Playwright. Proceeding with default settings. Error: {e}")
-        finally:
-            await page_robots.close()
+            rp.disallow_all = True
+            print(f"Warning: Could not fetch robots.txt with Playwright. Treating all URLs as disallowed. Error: {e}")
         
         crawl_delay = rp.crawl_delay(USER_AGENT)
         robots_delay = int(crawl_delay) if crawl_delay else None
@@ -97,101 +224,164 @@ async def crawl():
         if not os.path.exists(data_dir):
             os.makedirs(data_dir)
 
+        # Listing and detail pages are independent, so several are fetched at
+        # once. Each slot still keeps the randomized delay between the starts of
+        # its own requests.
+        # Each slot is an open page taken from this pool and returned when done,
+        # so pages are reused across URLs instead of being opened and closed per URL
+        page_pool = asyncio.Queue()
+        for _ in range(MAX_CONCURRENT_PAGES):
+            page_pool.put_nowait(await context.new_page())
+
+        # On top of that, the start of consecutive requests from all slots is
+        # spaced out by the effective minimum delay. Like a Crawl-Delay from
+        # robots.txt, it applies to the crawler as a whole, so running several
+        # slots does not raise the request rate above what a single slot allows.
+        request_interval = effective_delay_min
+        request_lock = asyncio.Lock()
+        next_request_time = 0.0
+
+        async def wait_for_request_turn():
+            nonlocal next_request_time
+            loop = asyncio.get_running_loop()
+            async with request_lock:
+                wait = next_request_time - loop.time()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                request_time = loop.time()
+                next_request_time = request_time + request_interval
+            return request_time
+
+        async def wait_out_delay(request_time):
+            # Polite crawling: the randomized delay is measured from the start of the
+            # slot's last request, so time spent loading the page already counts towards it
+            delay = random.uniform(effective_delay_min, effective_delay_min + 2.0)
+            remaining = request_time + delay - asyncio.get_running_loop().time()
+            if remaining > 0:
+                await asyncio.sleep(remaining)
+
         # PHASE 1: DISCOVER ALL PUBLICATION URLS
         print("\n--- Phase 1: Discovering all publication URLs ---")
-        publications_to_scrape = []
-        queue = deque([SEED_URL])
-        visited_urls = {SEED_URL}
-        
-        pbar_pages = tqdm(total=16, desc="Scanning Pages")
-
-        while queue:
-            current_url = queue.popleft()
+        # The total is filled in once the number of listing pages is known
+        pbar_pages = tqdm(total=None, desc="Scanning Pages")
 
+        async def fetch_listing_page(url, accept_cookies=False):
             # Check if URL is allowed by robots.txt before fetching
-            if not rp.can_fetch(USER_AGENT, current_url):
-                print(f"\nSkipping disallowed URL (from robots.txt): {current_url}")
+            if not rp.can_fetch(USER_AGENT, url):
+                print(f"\nSkipping disallowed URL (from robots.txt): {url}")
                 pbar_pages.update(1)
-                continue
+                return None
 
-            page = await context.new_page()
-            
-            success = False
-            for attempt in range(MAX_RETRIES):
-                try:
-                    await page.goto(current_url, wait_until='domcontentloaded', timeout=PAGE_TIMEOUT)
-                    if len(visited_urls) == 1:
-                        await page.click("#onetrust-accept-btn-handler", timeout=5000)
-                except Error:
-                    pass
-
-                try:
-                    await page.wait_for_selector('li.list-result-item', state='visible', timeout=30000)
-                    success = True
-                    break
-                except Error as e:
-                    print(f"\nAttempt {attempt + 1}/{MAX_RETRIES} failed for {current_url}: {e}")
-                    if attempt < MAX_RETRIES - 1:
-                        print('Retrying...')
-                        # Wait before retrying, respecting the effective delay
-                        delay = random.uniform(effective_delay_min, effective_delay_min + 2.0)
-                        await asyncio.sleep(delay)
-
-            if not success:
-                print(f"All retries failed for {current_url}. Skipping page.")
-                await page.close()
+            page = await page_pool.get()
+            request_time = asyncio.get_running_loop().time()
+            try:
+                for attempt in range(MAX_RETRIES):
+                    try:
+                        request_time = await wait_for_request_turn()
+                        await page.goto(url, wait_until='domcontentloaded', timeout=PAGE_TIMEOUT)
+                        if accept_cookies:
+                            await page.click("#onetrust-accept-btn-handler", timeout=5000)
+                    except Error:
+                        pass
+
+                    try:
+                        await page.wait_for_selector('li.list-result-item', state='visible', timeout=30000)
+                        return await page.content()
+                    except Error as e:
+                        print(f"\nAttempt {attempt + 1}/{MAX_RETRIES} failed for {url}: {e}")
+                        if attempt < MAX_RETRIES - 1:
+                            print('Retrying...')
+                            # Wait before retrying, respecting the effective delay
+                            delay = random.uniform(effective_delay_min, effective_delay_min + 2.0)
+                            await asyncio.sleep(delay)
+
+                print(f"All retries failed for {url}. Skipping page.")
+                return None
+
+            finally:
                 pbar_pages.update(1)
-                continue
-
-            soup = BeautifulSoup(await page.content(), 'html.parser')
-            # Find all publication items on the page
-            pub_list = soup.find_all('li', class_='list-result-item')
-            for pub_item in pub_list:
-                if isinstance(pub_item, Tag):
-                    title_tag = pub_item.find('h3', class_='title')
-                    if isinstance(title_tag, Tag) and title_tag.a:
-                        title = title_tag.get_text(strip=True)
-                        pub_url = urljoin(BASE_URL, str(title_tag.a['href']))
-                        date_tag = pub_item.find('span', class_='date')
-                        date = date_tag.get_text(strip=True) if date_tag else "N/A"
-                        publications_to_scrape.append({'title': title, 'url': pub_url, 'date': date})
-
-            next_page_tag = soup.find('a', class_='nextLink')
-            if isinstance(next_page_tag, Tag) and 'href' in next_page_tag.attrs:
-                next_page_url = urljoin(BASE_URL, str(next_page_tag['href']))
-                if next_page_url not in visited_urls:
-                    visited_urls.add(next_page_url)
-                    queue.append(next_page_url)
-            
-            pbar_pages.update(1)
-            await page.close()
+                await wait_out_delay(request_time)
+                page_pool.put_nowait(page)
+
+        # The first page links to the other listing pages, so they can all be
+        # requested at once instead of following 'next' links one by one
+        first_page = await fetch_listing_page(SEED_URL, accept_cookies=True)
+        listing_page_urls = extract_listing_page_urls(first_page, BASE_URL, SEED_URL) if first_page else []
+        pbar_pages.total = len(listing_page_urls) + 1
+        pbar_pages.refresh()
+        listing_pages = [first_page] + list(await asyncio.gather(*(fetch_listing_page(url) for url in listing_page_urls)))
+
+        publications_to_scrape = []
+        soup = None
+        for html in listing_pages:
+            if html:
+                soup = BeautifulSoup(html, HTML_PARSER, parse_only=LISTING_PAGE_ELEMENTS)
+                publications_to_scrape.extend(extract_publications_from_listing_page(soup, BASE_URL))
+
+        # Follow 'next' links from the last page in case the pagination did not
+        # link every page (or was not found at all)
+        visited_urls = {SEED_URL, *listing_page_urls}
+        while soup is not None:
+            next_page_url = extract_next_page_url(soup, BASE_URL)
+            if not next_page_url or next_page_url in visited_urls:
+                break
+            visited_urls.add(next_page_url)
+            pbar_pages.total += 1
+            html = await fetch_listing_page(next_page_url)
+            soup = BeautifulSoup(html, HTML_PARSER, parse_only=LISTING_PAGE_ELEMENTS) if html else None
+            if soup is not None:
+                publications_to_scrape.extend(extract_publications_from_listing_page(soup, BASE_URL))
 
-            # Polite crawling: wait before the next request using the effective delay
-            delay = random.uniform(effective_delay_min, effective_delay_min + 2.0)
-            await asyncio.sleep(delay)
-        
         pbar_pages.close()
+        # A portal that numbers its pages from 1 lists the first page twice, so
+        # each publication is only queued once
+        publications_to_scrape = list({pub_data['url']: pub_data for pub_data in publications_to_scrape}.values())
         print(f"--- Discovery complete. Found {len(publications_to_scrape)} publications to scrape. ---")
 
         # PHASE 2: SCRAPE AUTHOR DETAILS AND ABSTRACT FOR EACH PUBLICATION
         print("\n--- Phase 2: Scraping author details and abstract for each publication ---")
-        final_publications = []
-        for pub_data in tqdm(publications_to_scrape, desc="Scraping Author Details and Abstract"):
+        # Records are written as newline-delimited JSON in the order they finish, to a
+        # partial file that only replaces the previous crawl once this one has completed.
+        # If an earlier run was interrupted, its records are kept and not scraped again.
+        # With an empty discovery the partial file is left untouched for a later run.
+        partial_data_file = CRAWLED_DATA_FILE + '.partial'
+        resumed_publications = resume_partial_crawl(partial_data_file, publications_to_scrape) if publications_to_scrape else {}
+        if resumed_publications:
+            print(f"Resuming an interrupted crawl: {len(resumed_publications)} publications were already scraped.")
+        remaining_publications = [pub_data for pub_data in publications_to_scrape if pub_data['url'] not in resumed_publications]
+        pbar_details = tqdm(total=len(remaining_publications), desc="Scraping Author Details and Abstract")
+
+        async def fetch_detail_page(page, url):
+            if RENDER_DETAIL_PAGES:
+                await page.goto(url, wait_until='domcontentloaded', timeout=PAGE_TIMEOUT)
+                await page.wait_for_selector('p.relations.persons', state='visible', timeout=30000)
+                return await page.content()
+
+            # Server-rendered pages need no browser: the context's HTTP client sends the
+            # same User-Agent and cookies without loading or running anything
+            response = await context.request.get(url, timeout=PAGE_TIMEOUT)
+            if not response.ok:
+                raise Error(f"HTTP {response.status} for {url}")
+            return await response.text()
+
+        async def scrape_publication(pub_data):
             # Check if URL is allowed by robots.txt before fetching
             if not rp.can_fetch(USER_AGENT, pub_data['url']):
                 print(f"\nSkipping disallowed URL (from robots.txt): {pub_data['url']}")
-                continue
+                pbar_details.update(1)
+                return None
 
-            page = await context.new_page()
+            page = await page_pool.get()
+            request_time = asyncio.get_running_loop().time()
             try:
                 success = False
                 # --- RETRY LOGIC FOR DETAIL PAGES ---
                 for attempt in range(MAX_RETRIES):
                     try:
-                        await page.goto(pub_data['url'], wait_until='domcontentloaded', timeout=PAGE_TIMEOUT)
-                        await page.wait_for_selector('p.relations.persons', state='visible', timeout=30000)
+                        request_time = await wait_for_request_turn()
+                        detail_html = await fetch_detail_page(page, pub_data['url'])
                         
-                        detail_soup = BeautifulSoup(await page.content(), 'html.parser')
+                        detail_soup = BeautifulSoup(detail_html, HTML_PARSER, parse_only=DETAIL_PAGE_ELEMENTS)
                         pub_data['authors'] = extract_authors_from_detail_page(detail_soup, BASE_URL)
                         pub_data['abstract'] = extract_abstract_from_detail_page(detail_soup)
                         success = True
@@ -209,20 +399,36 @@ async def crawl():
                     pub_data['authors'] = [] # Ensure authors key exists even on failure
                     pub_data['abstract'] = '' # Ensure abstract key exists even on failure
                 
-                final_publications.append(pub_data)
+                # Persist the record right away so a crash does not lose the pages already scraped
+                output.write(orjson.dumps(pub_data) + b'\n')
+                output.flush()
+                return pub_data
             
             finally:
-                await page.close()
+                pbar_details.update(1)
                 # --- RANDOMIZED DELAY BETWEEN EACH DETAIL PAGE SCRAPE ---
-                delay = random.uniform(effective_delay_min, effective_delay_min + 2.0)
-                await asyncio.sleep(delay)
+                await wait_out_delay(request_time)
+                page_pool.put_nowait(page)
+
+        with open(partial_data_file, 'ab') as output:
+            scraped = await asyncio.gather(*(scrape_publication(pub_data) for pub_data in remaining_publications))
+        final_publications = list(resumed_publications.values()) + [pub_data for pub_data in scraped if pub_data is not None]
+        pbar_details.close()
+
+        # An empty discovery means the listing pages could not be read (or were
+        # disallowed), so the data from the last complete crawl is kept
+        if publications_to_scrape:
+            os.replace(partial_data_file, CRAWLED_DATA_FILE)
+
+        while not page_pool.empty():
+            await page_pool.get_nowait().close()
         
         print("\nClosing Playwright browser.")
         await browser.close()
 
-    # Save the extracted data to a file
-    with open(CRAWLED_DATA_FILE, 'w', encoding='utf-8') as f:
-        json.dump(final_publications, f, indent=4, ensure_ascii=False)
+    if not publications_to_scrape:
+        print(f"\nNo publications were discovered. Keeping the existing data in {CRAWLED_DATA_FILE}")
+        return
 
     print(f"\nCrawling complete. Found {len(final_publications)} publications.")
     print(f"Data saved to {CRAWLED_DATA_FILE}")
@@ -1,18 +1,41 @@
-import json
 import joblib
+import numpy as np
+import orjson
 from sklearn.feature_extraction.text import TfidfVectorizer
 
 from config import CRAWLED_DATA_FILE, INDEX_FILE
 from text_processor import process_text
 
+def pack_positional_index(vocabulary: dict, term_ids: list, doc_ids: list, positions: list) -> dict:
+    """
+    Packs (term_id, doc_id, position) postings, given in document and position
+    order, into flat arrays grouped by term.
+
+    The postings of term t are doc_ids[offsets[t]:offsets[t + 1]] and the matching
+    slice of positions, sorted by document and then position. Three int arrays
+    take a fraction of the memory of nested dicts and lists, and load without
+    unpickling one Python object per posting.
+    """
+    term_ids = np.asarray(term_ids, dtype=np.int32)
+    # A stable sort keeps the document and position order within each term
+    order = np.argsort(term_ids, kind='stable')
+    offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(term_ids, minlength=len(vocabulary)), out=offsets[1:])
+    return {
+        'vocabulary': vocabulary,
+        'offsets': offsets,
+        'doc_ids': np.asarray(doc_ids, dtype=np.int32)[order],
+        'positions': np.asarray(positions, dtype=np.int32)[order]
+    }
+
 def build_index():
     """
     Builds field-based positional indexes and TF-IDF models from crawled data.
 
     The function creates and saves four main components:
-    1. Positional Index: A map from a term to a dictionary, which in turn maps
-       doc_id to a list of positions where the term appears.
-       e.g., {'risk': {0: [3, 15], 2: [8]}}
+    1. Positional Index: A map from a term to its id, plus flat arrays holding
+       the (doc_id, position) pairs of every term, grouped by term id.
+       See pack_positional_index().
     2. Document Store: A map from doc_id to the document's metadata.
     3. TF-IDF Matrix: A sparse matrix containing TF-IDF vectors for all docs.
     4. TF-IDF Vectorizer: The fitted TfidfVectorizer object, essential for
@@ -21,14 +44,18 @@ def build_index():
     print("Starting field-based indexer...")
 
     try:
-        with open(CRAWLED_DATA_FILE, 'r', encoding='utf-8') as f:
-            publications = json.load(f)
+        # The crawler writes one JSON record per line; orjson parses the raw UTF-8 bytes directly
+        with open(CRAWLED_DATA_FILE, 'rb') as f:
+            publications = [orjson.loads(line) for line in f if line.strip()]
     except FileNotFoundError:
         print(f"Error: Crawled data file not found at {CRAWLED_DATA_FILE}.")
         return
 
     # Separate indexes for different fields
-    positional_index = {}
+    vocabulary = {}
+    posting_term_ids = []
+    posting_doc_ids = []
+    posting_positions = []
     doc_store = {}
     
     # Separate corpora for different fields
@@ -41,32 +68,28 @@ def build_index():
         doc_store[doc_id] = doc
         
         # Separate field content
-        title = doc['title']
-        author_names = ' '.join([author['name'] for author in doc['authors']])
-        abstract = doc['abstract']
-        
-        # Add to respective corpora
-        title_corpus.append(title)
-        author_corpus.append(author_names)
-        abstract_corpus.append(abstract)
-        
-        # Build positional index for combined content (for phrase queries)
-        combined_content = title + ' ' + author_names + ' ' + abstract
-        tokens = process_text(combined_content)
-        
-        for pos, token in enumerate(tokens):
-            if token not in positional_index:
-                positional_index[token] = {}
-            if doc_id not in positional_index[token]:
-                positional_index[token][doc_id] = []
-            positional_index[token][doc_id].append(pos)
+        title_corpus.append(doc['title'])
+        author_corpus.append(' '.join([author['name'] for author in doc['authors']]))
+        abstract_corpus.append(doc['abstract'])
+
+    # Build positional index for combined content (for phrase queries)
+    combined_corpus = [' '.join(fields) for fields in zip(title_corpus, author_corpus, abstract_corpus)]
+    tokenized_corpus = [process_text(content) for content in combined_corpus]
+
+    for doc_id, tokens in enumerate(tokenized_corpus):
+        posting_term_ids.extend(vocabulary.setdefault(token, len(vocabulary)) for token in tokens)
+        posting_doc_ids.extend([doc_id] * len(tokens))
+        posting_positions.extend(range(len(tokens)))
+
+    positional_index = pack_positional_index(vocabulary, posting_term_ids, posting_doc_ids, posting_positions)
 
-    # Create separate TF-IDF vectorizers for each field
+    # Create separate TF-IDF vectorizers for each field. float32 halves the size of
+    # the stored matrices; scores only move well below the displayed precision.
     print("\nCreating field-specific TF-IDF models...")
     
-    title_vectorizer = TfidfVectorizer(stop_words='english', lowercase=True, ngram_range=(1, 2))
-    author_vectorizer = TfidfVectorizer(stop_words='english', lowercase=True, ngram_range=(1, 2))
-    abstract_vectorizer = TfidfVectorizer(stop_words='english', lowercase=True, ngram_range=(1, 2))
+    title_vectorizer = TfidfVectorizer(stop_words='english', lowercase=True, ngram_range=(1, 2), dtype=np.float32)
+    author_vectorizer = TfidfVectorizer(stop_words='english', lowercase=True, ngram_range=(1, 2), dtype=np.float32)
+    abstract_vectorizer = TfidfVectorizer(stop_words='english', lowercase=True, ngram_range=(1, 2), dtype=np.float32)
     
     title_matrix = title_vectorizer.fit_transform(title_corpus)
     author_matrix = author_vectorizer.fit_transform(author_corpus)
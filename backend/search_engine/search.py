@@ -1,6 +1,5 @@
 import joblib
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 from typing import List, Optional, TypedDict
 
 from config import INDEX_FILE
@@ -33,6 +32,10 @@ class SearchEngine:
             self.positional_index = index_data['positional_index']
             self.doc_store = index_data['doc_store']
             
+            # Every field of a result except its score is fixed per document, so the
+            # result records are built once here instead of for every hit of every query
+            self.formatted_docs = {doc_id: self._format_publication(doc_info) for doc_id, doc_info in self.doc_store.items()}
+            
             # Field-specific components
             self.title_matrix = index_data['title_matrix']
             self.author_matrix = index_data['author_matrix']
@@ -41,6 +44,10 @@ class SearchEngine:
             self.author_vectorizer = index_data['author_vectorizer']
             self.abstract_vectorizer = index_data['abstract_vectorizer']
             
+            # The indexer builds the three vectorizers with identical settings, so a
+            # query is tokenized once and the terms are looked up in each field's vocabulary
+            self.query_analyzer = self.title_vectorizer.build_analyzer()
+            
             # Default field weights (can be adjusted based on query type)
             self.field_weights = {
                 'title': 3.0,    # Highest weight for title matches
@@ -54,63 +61,96 @@ class SearchEngine:
             print("Please run the indexer first using 'python main.py index'.")
             exit()
 
-    def _find_docs_with_phrase(self, phrase_tokens: list[str]) -> set[int]:
+    def _term_occurrences(self, term: str) -> np.ndarray:
+        """
+        Returns every occurrence of a term as a sorted array of (doc_id << 32) + position keys.
+        """
+        term_id = self.positional_index['vocabulary'].get(term)
+        if term_id is None:
+            return np.empty(0, dtype=np.int64)
+        start, end = self.positional_index['offsets'][term_id:term_id + 2]
+        doc_ids = self.positional_index['doc_ids'][start:end].astype(np.int64)
+        return (doc_ids << 32) + self.positional_index['positions'][start:end]
+
+    def _find_docs_with_phrase(self, phrase_tokens: list[str]) -> np.ndarray:
         """
         Helper function to find documents containing an exact sequence of tokens
         using the positional index.
+
+        Each occurrence of the i-th token is shifted back by i positions, so the
+        phrase matches wherever all shifted occurrence keys coincide. Candidates
+        start from the rarest token, and each other token is checked by binary
+        search in its sorted keys, so the work scales with the rarest posting list.
         """
         if not phrase_tokens:
-            return set()
+            return np.empty(0, dtype=np.int64)
 
-        first_term = phrase_tokens[0]
-        if first_term not in self.positional_index:
-            return set()
-        
-        candidate_docs = set(self.positional_index[first_term].keys())
+        occurrences = [self._term_occurrences(term) for term in phrase_tokens]
+        order = sorted(range(len(phrase_tokens)), key=lambda i: occurrences[i].size)
 
-        for i in range(1, len(phrase_tokens)):
-            term = phrase_tokens[i]
-            if not candidate_docs: 
+        rarest = order[0]
+        matches = occurrences[rarest] - rarest
+        for i in order[1:]:
+            if matches.size == 0:
                 break
-            if term not in self.positional_index: 
-                return set()
-
-            docs_with_term = self.positional_index[term]
-            matching_docs_for_term = set()
+            keys = occurrences[i]
+            wanted = matches + i
+            found = keys[np.minimum(np.searchsorted(keys, wanted), keys.size - 1)] == wanted
+            matches = matches[found]
+        
+        return np.unique(matches >> 32)
 
-            for doc_id in candidate_docs:
-                if doc_id in docs_with_term:
-                    prev_positions = self.positional_index[phrase_tokens[i-1]][doc_id]
-                    current_positions = docs_with_term[doc_id]
-                    if any((pos + 1) in current_positions for pos in prev_positions):
-                        matching_docs_for_term.add(doc_id)
-            
-            candidate_docs = matching_docs_for_term
+    def _query_vector(self, vectorizer, query_terms: list[str]) -> np.ndarray:
+        """
+        Builds the same L2-normalized TF-IDF vector as vectorizer.transform([query])
+        from already analyzed query terms, as a dense array over the vocabulary.
+        A sparse matrix times a dense vector is a single pass over the matrix,
+        several times faster than a sparse-by-sparse product.
+        """
+        vocabulary = vectorizer.vocabulary_
+        term_ids = [vocabulary[term] for term in query_terms if term in vocabulary]
+        term_ids, counts = np.unique(np.array(term_ids, dtype=np.int32), return_counts=True)
         
-        return candidate_docs
+        # Match the dtype of the indexed matrices so the sparse product does not
+        # upcast them to float64 on every query
+        weights = (counts * vectorizer.idf_[term_ids]).astype(vectorizer.dtype)
+        norm = np.sqrt(np.dot(weights, weights))
+        if norm > 0:
+            weights /= norm
+        query_vec = np.zeros(len(vocabulary), dtype=vectorizer.dtype)
+        query_vec[term_ids] = weights
+        return query_vec
 
-    def _calculate_field_scores(self, query: str) -> dict:
+    def _calculate_field_scores(self, query: str, doc_ids: Optional[np.ndarray] = None) -> dict:
         """
         Calculate TF-IDF scores for the query against each field.
         Returns a dictionary with field names as keys and score arrays as values.
+        If doc_ids is given, only those documents are scored and the arrays are
+        aligned with doc_ids instead of covering the whole collection.
         """
         field_scores = {}
+        title_matrix, author_matrix, abstract_matrix = self.title_matrix, self.author_matrix, self.abstract_matrix
+        if doc_ids is not None:
+            title_matrix, author_matrix, abstract_matrix = title_matrix[doc_ids], author_matrix[doc_ids], abstract_matrix[doc_ids]
         
         try:
             # Transform query for each field
-            title_query_vec = self.title_vectorizer.transform([query])
-            author_query_vec = self.author_vectorizer.transform([query])
-            abstract_query_vec = self.abstract_vectorizer.transform([query])
+            query_terms = self.query_analyzer(query)
+            title_query_vec = self._query_vector(self.title_vectorizer, query_terms)
+            author_query_vec = self._query_vector(self.author_vectorizer, query_terms)
+            abstract_query_vec = self._query_vector(self.abstract_vectorizer, query_terms)
             
-            # Calculate cosine similarities
-            field_scores['title'] = cosine_similarity(title_query_vec, self.title_matrix).flatten()
-            field_scores['author'] = cosine_similarity(author_query_vec, self.author_matrix).flatten()
-            field_scores['abstract'] = cosine_similarity(abstract_query_vec, self.abstract_matrix).flatten()
+            # Calculate cosine similarities. The indexed rows and the query vectors are
+            # already L2-normalized by TfidfVectorizer, so the cosine is a plain sparse
+            # dot product; cosine_similarity() would re-normalize every matrix per query.
+            field_scores['title'] = title_matrix @ title_query_vec
+            field_scores['author'] = author_matrix @ author_query_vec
+            field_scores['abstract'] = abstract_matrix @ abstract_query_vec
             
         except ValueError as e:
             print(f"Warning: Query transformation failed: {e}")
             # Return zero scores if transformation fails
-            num_docs = len(self.doc_store)
+            num_docs = len(self.doc_store) if doc_ids is None else len(doc_ids)
             field_scores = {
                 'title': np.zeros(num_docs),
                 'author': np.zeros(num_docs),
@@ -119,6 +159,67 @@ class SearchEngine:
         
         return field_scores
 
+    def _combine_field_scores(self, field_scores: dict, weights: dict) -> np.ndarray:
+        """
+        Combines the per-field score arrays into one weighted score per document,
+        normalized by the total weight. Works on whole arrays at once instead of
+        looping over documents in Python.
+        """
+        combined = (
+            weights['title'] * field_scores['title'] +
+            weights['author'] * field_scores['author'] +
+            weights['abstract'] * field_scores['abstract']
+        )
+        return combined / sum(weights.values())
+
+    def _format_publication(self, doc_info: dict) -> dict:
+        """
+        Builds the fields of a Publication result for a stored document, with
+        authors in the Author format. Only relevancyScore is left to add.
+        """
+        formatted_authors: List[Author] = [
+            {"name": author["name"], "profileUrl": author.get("url")}
+            for author in doc_info.get("authors", [])
+        ]
+        
+        return {
+            "title": doc_info.get("title", "No Title"),
+            "authors": formatted_authors,
+            "abstract": doc_info.get("abstract", ""),
+            "date": doc_info.get("date", "N/A"),
+            "publicationUrl": doc_info.get("url", "")
+        }
+
+    def _format_results(self, doc_scores: list[tuple[int, float]]) -> List[Publication]:
+        """
+        Turns ranked (doc_id, score) pairs into Publication results. The records
+        share the preformatted author lists, which are read-only.
+        """
+        return [
+            {**self.formatted_docs[doc_id], "relevancyScore": round(score, 4)}
+            for doc_id, score in doc_scores
+        ]
+
+    def _rank_top_k(self, doc_ids: np.ndarray, candidate_scores: np.ndarray, top_k: int) -> list[tuple[int, float]]:
+        """
+        Returns the top_k (doc_id, score) pairs among doc_ids, best first, where
+        candidate_scores[i] is the score of doc_ids[i].
+        The k-th best score is found with np.partition in linear time, and only
+        the candidates scoring at least that much are sorted. Every candidate tied
+        at that score is kept for the sort, so ties keep the lower doc_id first,
+        exactly as a full stable sort would.
+        """
+        if top_k <= 0:
+            return []
+
+        if top_k < len(doc_ids):
+            kth_score = -np.partition(-candidate_scores, top_k - 1)[top_k - 1]
+            keep = candidate_scores >= kth_score
+            doc_ids, candidate_scores = doc_ids[keep], candidate_scores[keep]
+
+        order = np.lexsort((doc_ids, -candidate_scores))[:top_k]
+        return list(zip(doc_ids[order].tolist(), candidate_scores[order].tolist()))
+
     def _detect_query_intent(self, query: str) -> dict:
         """
         Analyze the query to determine field weights based on content.
@@ -168,25 +269,17 @@ class SearchEngine:
             # Use the positional index to get matching documents
             matching_doc_ids = self._find_docs_with_phrase(phrase_tokens)
             
-            if not matching_doc_ids:
+            if matching_doc_ids.size == 0:
                 return []
             
-            # Calculate field scores for all documents
-            field_scores = self._calculate_field_scores(search_query)
+            # Calculate field scores for the matching documents only
+            field_scores = self._calculate_field_scores(search_query, matching_doc_ids)
             
-            # Combine scores with weights, but only for matching documents
-            final_scores = []
-            for doc_id in matching_doc_ids:
-                weighted_score = (
-                    current_weights['title'] * field_scores['title'][doc_id] +
-                    current_weights['author'] * field_scores['author'][doc_id] +
-                    current_weights['abstract'] * field_scores['abstract'][doc_id]
-                ) / sum(current_weights.values())  # Normalize by total weight
-                
-                final_scores.append((doc_id, weighted_score))
+            # Combine scores with weights, aligned with matching_doc_ids
+            scores = self._combine_field_scores(field_scores, current_weights)
             
-            # Sort by score
-            final_scores.sort(key=lambda x: x[1], reverse=True)
+            # Keep the best top_k by score
+            final_scores = self._rank_top_k(matching_doc_ids, scores, top_k)
 
         else:
             print("--- Detected Field-Based Query ---")
@@ -198,43 +291,16 @@ class SearchEngine:
             field_scores = self._calculate_field_scores(search_query)
             
             # Combine scores with weights
-            final_scores = []
-            num_docs = len(self.doc_store)
+            scores = self._combine_field_scores(field_scores, current_weights)
             
-            for doc_id in range(num_docs):
-                weighted_score = (
-                    current_weights['title'] * field_scores['title'][doc_id] +
-                    current_weights['author'] * field_scores['author'][doc_id] +
-                    current_weights['abstract'] * field_scores['abstract'][doc_id]
-                ) / sum(current_weights.values())  # Normalize by total weight
-                
-                if weighted_score > 0:  # Only include documents with some relevance
-                    final_scores.append((doc_id, weighted_score))
+            # Only include documents with some relevance
+            doc_ids = np.flatnonzero(scores > 0)
             
-            # Sort by score
-            final_scores.sort(key=lambda x: x[1], reverse=True)
+            # Keep the best top_k by score
+            final_scores = self._rank_top_k(doc_ids, scores[doc_ids], top_k)
 
         # 2. Format and return the top_k results
-        results: List[Publication] = []
-        for doc_id, score in final_scores[:top_k]:
-            doc_info = self.doc_store[doc_id]
-            
-            # Format authors to match the Author interface
-            formatted_authors: List[Author] = [
-                {"name": author["name"], "profileUrl": author.get("url")}
-                for author in doc_info.get("authors", [])
-            ]
-            
-            # Create the publication object with the correct keys
-            publication: Publication = {
-                "title": doc_info.get("title", "No Title"),
-                "authors": formatted_authors,
-                "abstract": doc_info.get("abstract", ""),
-                "date": doc_info.get("date", "N/A"),
-                "publicationUrl": doc_info.get("url", ""),
-                "relevancyScore": round(score, 4)
-            }
-            results.append(publication)
+        results = self._format_results(final_scores)
         
         return results
 
@@ -253,29 +319,12 @@ class SearchEngine:
         field_scores = self._calculate_field_scores(query)
         scores = field_scores[field]
         
-        # Create list of (doc_id, score) pairs
-        doc_scores = [(i, scores[i]) for i in range(len(scores)) if scores[i] > 0]
-        doc_scores.sort(key=lambda x: x[1], reverse=True)
+        # Rank the documents with a non-zero score
+        doc_ids = np.flatnonzero(scores > 0)
+        doc_scores = self._rank_top_k(doc_ids, scores[doc_ids], top_k)
         
         # Format results
-        results: List[Publication] = []
-        for doc_id, score in doc_scores[:top_k]:
-            doc_info = self.doc_store[doc_id]
-            
-            formatted_authors: List[Author] = [
-                {"name": author["name"], "profileUrl": author.get("url")}
-                for author in doc_info.get("authors", [])
-            ]
-            
-            publication: Publication = {
-                "title": doc_info.get("title", "No Title"),
-                "authors": formatted_authors,
-                "abstract": doc_info.get("abstract", ""),
-                "date": doc_info.get("date", "N/A"),
-                "publicationUrl": doc_info.get("url", ""),
-                "relevancyScore": round(score, 4)
-            }
-            results.append(publication)
+        results = self._format_results(doc_scores)
         
         return results
 